@@ -0,0 +1,112 @@
+"""Benchmark query latency and ingestion throughput of the sharded vector store.
+
+Run from the backend directory, e.g.::
+
+    python benchmark_shards.py --shards 1 2 4 --chunks 40000
+
+By default chunks are embedded with a deterministic offline embedding so the
+numbers reflect indexing and search cost rather than API quota.  Use
+``--embed-delay`` to add a per-batch round trip that mimics a remote embedding
+service, or ``--google`` to call the real Google embeddings.
+"""
+import os
+import time
+import random
+import shutil
+import argparse
+import tempfile
+import statistics
+from functools import partial
+from langchain_community.embeddings import DeterministicFakeEmbedding
+from sharded_store import ShardedVectorStore, google_embeddings
+
+WORDS = ("revenue margin forecast audit ledger equity asset liability cash flow "
+         "quarter growth market risk volatility return yield bond index portfolio").split()
+
+
+class DelayedFakeEmbedding(DeterministicFakeEmbedding):
+    """Deterministic embedding that sleeps per batch like a remote service would."""
+
+    delay: float = 0.0
+
+    def embed_documents(self, texts):
+        if self.delay:
+            time.sleep(self.delay * ((len(texts) + 99) // 100))
+        return super().embed_documents(texts)
+
+
+def offline_embeddings(size, delay):
+    return DelayedFakeEmbedding(size=size, delay=delay)
+
+
+def make_corpus(num_chunks, chunks_per_doc, seed=0):
+    rng = random.Random(seed)
+    texts, metadatas = [], []
+    for i in range(num_chunks):
+        texts.append(" ".join(rng.choice(WORDS) for _ in range(40)) + f" #{i}")
+        metadatas.append({"source": f"doc_{i // chunks_per_doc}.pdf", "chunk_id": i % chunks_per_doc})
+    return texts, metadatas
+
+
+def run(num_shards, texts, metadatas, args, embedding_factory):
+    base_path = tempfile.mkdtemp(prefix=f"shards_{num_shards}_")
+    try:
+        with ShardedVectorStore(base_path, num_shards, embedding_factory=embedding_factory) as store:
+            store.count()  # wait for every worker to finish booting
+
+            start = time.perf_counter()
+            for i in range(0, len(texts), args.batch_size):
+                store.add_texts(texts[i:i + args.batch_size], metadatas=metadatas[i:i + args.batch_size])
+            ingest_seconds = time.perf_counter() - start
+
+            query_vectors = [store.embeddings.embed_query(f"query {i}") for i in range(args.queries)]
+            latencies = []
+            for vector in query_vectors:
+                start = time.perf_counter()
+                store.similarity_search_with_score_by_vector(vector, k=args.k)
+                latencies.append((time.perf_counter() - start) * 1000)
+            counts = store.count()
+    finally:
+        shutil.rmtree(base_path, ignore_errors=True)
+
+    latencies.sort()
+    return {
+        "shards": num_shards,
+        "chunks_per_sec": len(texts) / ingest_seconds,
+        "p50_ms": statistics.median(latencies),
+        "p95_ms": latencies[int(len(latencies) * 0.95) - 1],
+        "min_shard": min(counts),
+        "max_shard": max(counts),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--shards", type=int, nargs="+", default=[1, 2, 4])
+    parser.add_argument("--chunks", type=int, default=40000, help="total chunks to ingest")
+    parser.add_argument("--chunks-per-doc", type=int, default=50, help="chunks per uploaded document")
+    parser.add_argument("--batch-size", type=int, default=5000, help="chunks per add_texts call")
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--k", type=int, default=5)
+    parser.add_argument("--dim", type=int, default=768, help="offline embedding size")
+    parser.add_argument("--embed-delay", type=float, default=0.0,
+                        help="seconds slept per 100 chunks embedded, to mimic a remote API")
+    parser.add_argument("--google", action="store_true", help="use Google embeddings instead of offline ones")
+    args = parser.parse_args()
+
+    if args.google:
+        embedding_factory = google_embeddings
+    else:
+        embedding_factory = partial(offline_embeddings, args.dim, args.embed_delay)
+
+    texts, metadatas = make_corpus(args.chunks, args.chunks_per_doc)
+    print(f"{args.chunks} chunks, {args.queries} queries, k={args.k}, cpus={os.cpu_count()}")
+    print(f"{'shards':>6} {'ingest chunks/s':>16} {'p50 ms':>8} {'p95 ms':>8} {'shard sizes':>16}")
+    for num_shards in args.shards:
+        result = run(num_shards, texts, metadatas, args, embedding_factory)
+        print(f"{result['shards']:>6} {result['chunks_per_sec']:>16.0f} {result['p50_ms']:>8.2f} "
+              f"{result['p95_ms']:>8.2f} {result['min_shard']:>7}-{result['max_shard']:<8}")
+
+
+if __name__ == "__main__":
+    main()
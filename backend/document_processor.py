@@ -10,6 +10,7 @@ from langchain_community.document_loaders import PyPDFLoader, TextLoader, Docx2t
 from langchain.text_splitter import RecursiveCharacterTextSplitter
 from langchain_google_genai import GoogleGenerativeAIEmbeddings
 from langchain_chroma import Chroma
+from sharded_store import get_shared_store, shard_count_from_env
 import requests
 
 
@@ -34,6 +35,8 @@ if not api_key:
 current_dir = os.path.dirname(os.path.abspath(__file__))
 persistent_directory = os.path.join(current_dir, "db", "chroma_db_with_metadata")
 os.makedirs(persistent_directory, exist_ok=True)
+sharded_directory = os.path.join(current_dir, "db", "shards")
+num_shards = shard_count_from_env()
 
 
 def initialize_embeddings(max_retries=3, retry_delay=2):
@@ -61,11 +64,16 @@ def initialize_embeddings(max_retries=3, retry_delay=2):
             logger.error(f"Error initializing Google embeddings: {str(e)}")
             raise
 
-try:
-    embeddings = initialize_embeddings()
-except Exception as e:
-    logger.error(f"Fatal error initializing embeddings: {str(e)}")
-    sys.exit(1)
+# Initialized on first use so that importing this module (e.g. when shard
+# workers are spawned) does not probe the embeddings API.
+embeddings = None
+
+def get_embeddings():
+    """Returns the embeddings client, initializing it on first use."""
+    global embeddings
+    if embeddings is None:
+        embeddings = initialize_embeddings()
+    return embeddings
 
 def install_dependency(package):
     """Installs missing dependencies."""
@@ -148,7 +156,16 @@ def process_document(file_path, original_filename):
         for attempt in range(max_retries):
             try:
                 logger.info(f"Attempt {attempt+1}/{max_retries} to store documents in vector DB")
-                db = Chroma(persist_directory=persistent_directory, embedding_function=embeddings)
+                if num_shards > 1:
+                    # Each shard worker embeds its own chunks, so the whole document goes in one call.
+                    # Stable ids let a retry skip chunks that a shard already stored.
+                    get_shared_store(sharded_directory, num_shards).add_documents(
+                        chunks, ids=[f"{doc_id}:{chunk.metadata['chunk_id']}" for chunk in chunks]
+                    )
+                    logger.info(f"Document stored in sharded vector DB with ID: {doc_id}")
+                    return doc_id
+
+                db = Chroma(persist_directory=persistent_directory, embedding_function=get_embeddings())
                 
               
                 batch_size = 5
@@ -184,8 +201,11 @@ def process_document(file_path, original_filename):
 def debug_vector_retrieval(query, k=5):
     """Tests the retrieval system by running a sample query."""
     try:
-        db = Chroma(persist_directory=persistent_directory, embedding_function=embeddings)
-        results = db.similarity_search(query, k=k)
+        if num_shards > 1:
+            results = get_shared_store(sharded_directory, num_shards).similarity_search(query, k=k)
+        else:
+            db = Chroma(persist_directory=persistent_directory, embedding_function=get_embeddings())
+            results = db.similarity_search(query, k=k)
         logger.info("Retrieved Documents:")
         for res in results:
             logger.info(res.page_content[:500])  
@@ -14,6 +14,7 @@ from langchain.chains import create_retrieval_chain
 from langchain.prompts import PromptTemplate
 from dotenv import load_dotenv
 from langchain_core.documents import Document
+from sharded_store import get_shared_store, shard_count_from_env
 
 import fitz  
 
@@ -34,6 +35,13 @@ if not google_api_key:
 
 logger.info(f"API key available: {bool(google_api_key)}")
 vectorstore_path = "vectorstore/faiss_index"
+sharded_vectorstore_path = "vectorstore/shards"
+num_shards = shard_count_from_env()
+
+
+def get_sharded_vectorstore():
+    """Return the sharded vector store, starting its worker processes on first use."""
+    return get_shared_store(sharded_vectorstore_path, num_shards)
 
 
 def load_pdf_with_pymupdf(file_path):
@@ -100,6 +108,13 @@ def process_pdf(file_path, append_to_existing=False):
         split_docs = text_splitter.split_documents(docs)
         logger.info(f"Split into {len(split_docs)} chunks")
 
+        # Route the chunks to their owning shard when the index is partitioned
+        if num_shards > 1:
+            vectorstore = get_sharded_vectorstore()
+            vectorstore.add_documents(split_docs)
+            logger.info(f"Added {len(split_docs)} chunks to sharded vector store ({num_shards} shards)")
+            return vectorstore
+
         # Change to Google embeddings with updated model name
         embeddings = GoogleGenerativeAIEmbeddings(
             google_api_key=google_api_key,
@@ -139,6 +154,13 @@ def process_pdf(file_path, append_to_existing=False):
 
 def load_vectorstore():
     try:
+        if num_shards > 1:
+            vectorstore = get_sharded_vectorstore()
+            if vectorstore.is_empty():
+                logger.warning("No vectors found in any shard")
+                return None
+            return vectorstore
+
         if os.path.exists(vectorstore_path):
             logger.info(f"Loading vector store from {vectorstore_path}")
 
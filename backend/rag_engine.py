@@ -2,6 +2,7 @@ import os
 from langchain_google_genai import ChatGoogleGenerativeAI, GoogleGenerativeAIEmbeddings
 from langchain_chroma import Chroma
 from langchain_core.messages import HumanMessage, SystemMessage
+from sharded_store import get_shared_store, shard_count_from_env
 from dotenv import load_dotenv
 
 # Load environment variables
@@ -29,10 +30,16 @@ class RAGEngine:
         )
         
        
-        self.db = Chroma(
-            persist_directory=self.persistent_directory,
-            embedding_function=self.embeddings
-        )
+        num_shards = shard_count_from_env()
+        if num_shards > 1:
+            self.db = get_shared_store(
+                os.path.join(current_dir, "db", "shards"), num_shards
+            )
+        else:
+            self.db = Chroma(
+                persist_directory=self.persistent_directory,
+                embedding_function=self.embeddings
+            )
         
        
         self.retriever = self.db.as_retriever(
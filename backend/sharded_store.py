@@ -0,0 +1,413 @@
+import os
+import fcntl
+import heapq
+import atexit
+import json
+import hashlib
+import logging
+import tempfile
+import threading
+import uuid
+import multiprocessing
+from concurrent.futures import ThreadPoolExecutor
+from dotenv import load_dotenv
+from langchain_core.documents import Document
+from langchain_core.vectorstores import VectorStore
+from langchain_community.vectorstores import FAISS
+from langchain_google_genai import GoogleGenerativeAIEmbeddings
+
+logger = logging.getLogger(__name__)
+
+load_dotenv()
+
+
+def shard_count_from_env(default=1):
+    """Read the number of vector store shards from VECTORSTORE_SHARDS."""
+    try:
+        return max(1, int(os.getenv("VECTORSTORE_SHARDS", default)))
+    except ValueError:
+        logger.warning("Invalid VECTORSTORE_SHARDS value, falling back to a single index")
+        return default
+
+
+def google_embeddings():
+    """Build the Google embeddings client. Runs inside each worker process."""
+    return GoogleGenerativeAIEmbeddings(
+        google_api_key=os.getenv("GOOGLE_API_KEY"),
+        model="models/embedding-001"
+    )
+
+
+_shared_stores = {}
+_shared_stores_lock = threading.Lock()
+
+
+def get_shared_store(base_path, num_shards=None, embedding_factory=google_embeddings):
+    """Return the process-wide store for ``base_path``, starting it on first use.
+
+    Every module in a process must go through here so that a shard directory
+    is served by exactly one set of workers per process.
+    """
+    key = os.path.abspath(base_path)
+    with _shared_stores_lock:
+        store = _shared_stores.get(key)
+        if store is None:
+            store = ShardedVectorStore(key, num_shards or shard_count_from_env(), embedding_factory=embedding_factory)
+            _shared_stores[key] = store
+    return store.start()
+
+
+@atexit.register
+def _close_shared_stores():
+    with _shared_stores_lock:
+        for store in _shared_stores.values():
+            store.close()
+        _shared_stores.clear()
+
+
+def shard_for_key(key, num_shards):
+    """Map a routing key (document hash or tenant) to a shard number."""
+    digest = hashlib.md5(str(key).encode("utf-8")).digest()
+    return int.from_bytes(digest[:8], "big") % num_shards
+
+
+def _shard_worker(shard_id, shard_path, embedding_factory, conn):
+    """Serve one FAISS shard: embed and index uploads, answer vector searches.
+
+    The on-disk shard may also be written by workers in other processes, so
+    writes hold an exclusive lock on the shard directory and the in-memory
+    index is reloaded whenever the files on disk have changed.
+    """
+    logging.basicConfig(level=logging.INFO)
+    worker_logger = logging.getLogger(f"{__name__}.shard{shard_id}")
+    embeddings = embedding_factory()
+    index_files = [os.path.join(shard_path, "index.faiss"), os.path.join(shard_path, "index.pkl")]
+    lock_file = open(os.path.join(shard_path, ".lock"), "a")
+    store = None
+    loaded_version = None
+
+    def disk_version():
+        try:
+            return tuple(os.stat(path).st_mtime_ns for path in index_files)
+        except FileNotFoundError:
+            return None
+
+    def refresh():
+        nonlocal store, loaded_version
+        version = disk_version()
+        if version is not None and version != loaded_version:
+            store = FAISS.load_local(shard_path, embeddings, allow_dangerous_deserialization=True)
+            loaded_version = version
+            worker_logger.info(f"Loaded shard {shard_id} from {shard_path} ({store.index.ntotal} vectors)")
+
+    def refresh_if_changed():
+        # Pick up writes made by workers in other processes before reading
+        if disk_version() != loaded_version:
+            fcntl.flock(lock_file, fcntl.LOCK_SH)
+            try:
+                refresh()
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    refresh_if_changed()
+
+    while True:
+        try:
+            op, payload = conn.recv()
+        except EOFError:
+            break
+        if op == "stop":
+            conn.send(("ok", None))
+            break
+        try:
+            if op == "add":
+                texts, metadatas, ids = payload
+                fcntl.flock(lock_file, fcntl.LOCK_EX)
+                try:
+                    refresh()
+                    # Skip ids already indexed so that retrying a partially failed add is safe
+                    if store is not None:
+                        new = [i for i, doc_id in enumerate(ids)
+                               if not isinstance(store.docstore.search(doc_id), Document)]
+                        texts, metadatas, ids = ([values[i] for i in new] for values in (texts, metadatas, ids))
+                    if ids:
+                        if store is None:
+                            store = FAISS.from_texts(texts, embeddings, metadatas=metadatas, ids=ids)
+                        else:
+                            store.add_texts(texts, metadatas=metadatas, ids=ids)
+                        store.save_local(shard_path)
+                        loaded_version = disk_version()
+                finally:
+                    fcntl.flock(lock_file, fcntl.LOCK_UN)
+                result = len(ids)
+            elif op == "search":
+                vector, k, search_filter = payload
+                refresh_if_changed()
+                if store is None:
+                    result = []
+                else:
+                    result = store.similarity_search_with_score_by_vector(vector, k=k, filter=search_filter)
+            elif op == "count":
+                refresh_if_changed()
+                result = store.index.ntotal if store is not None else 0
+            else:
+                raise ValueError(f"Unknown shard operation: {op}")
+            conn.send(("ok", result))
+        except Exception as e:
+            worker_logger.error(f"Shard {shard_id} failed on {op}: {str(e)}")
+            # Send the exception itself so callers can tell transient errors apart
+            try:
+                conn.send(("error", e))
+            except Exception:
+                conn.send(("error", RuntimeError(f"Shard {shard_id} error: {type(e).__name__}: {str(e)}")))
+    lock_file.close()
+    conn.close()
+
+
+class ShardedVectorStore(VectorStore):
+    """FAISS index partitioned across local worker processes.
+
+    Each shard lives in its own process and directory under ``base_path``.
+    Uploads are routed to the owning shard by document or tenant key, and
+    queries are scattered to every shard and the per-shard top-k merged.
+    """
+
+    def __init__(self, base_path, num_shards, embedding_factory=google_embeddings, route_by="document"):
+        if num_shards < 1:
+            raise ValueError("num_shards must be at least 1")
+        if route_by not in ("document", "tenant"):
+            raise ValueError(f"Unsupported routing mode: {route_by}")
+        self.base_path = base_path
+        self.num_shards = num_shards
+        self.embedding_factory = embedding_factory
+        self.route_by = route_by
+        self._embeddings = None
+        self._workers = []
+        self._conns = []
+        self._locks = []
+        self._pool = None
+        self._has_vectors = False
+        self._start_lock = threading.Lock()
+
+    @property
+    def embeddings(self):
+        if self._embeddings is None:
+            self._embeddings = self.embedding_factory()
+        return self._embeddings
+
+    def _check_layout(self):
+        """Record the shard layout on first start and refuse to reopen it differently.
+
+        Routing depends on the shard count, so reopening a store with another
+        count would hide existing shards from search and misroute uploads.
+        """
+        os.makedirs(self.base_path, exist_ok=True)
+        layout_path = os.path.join(self.base_path, "shards.json")
+        layout = {"num_shards": self.num_shards, "route_by": self.route_by}
+        # Write the layout to a temp file and link it into place, so that a
+        # concurrently starting process never reads a partially written file.
+        fd, tmp_path = tempfile.mkstemp(dir=self.base_path, prefix=".shards.", suffix=".json")
+        try:
+            with os.fdopen(fd, "w") as f:
+                json.dump(layout, f)
+            os.link(tmp_path, layout_path)
+            return
+        except FileExistsError:
+            pass
+        finally:
+            os.unlink(tmp_path)
+        with open(layout_path) as f:
+            saved = json.load(f)
+        if saved != layout:
+            raise ValueError(
+                f"Vector store at {self.base_path} was created with {saved['num_shards']} shards "
+                f"routed by {saved['route_by']}, but {self.num_shards} shards routed by "
+                f"{self.route_by} were requested. Set VECTORSTORE_SHARDS={saved['num_shards']} "
+                f"or reshard the store into a new directory."
+            )
+
+    def _spawn(self, shard_id):
+        ctx = multiprocessing.get_context("spawn")
+        shard_path = os.path.join(self.base_path, f"shard_{shard_id}")
+        os.makedirs(shard_path, exist_ok=True)
+        parent_conn, child_conn = ctx.Pipe()
+        worker = ctx.Process(
+            target=_shard_worker,
+            args=(shard_id, shard_path, self.embedding_factory, child_conn),
+            daemon=True,
+        )
+        worker.start()
+        child_conn.close()
+        with self._locks[shard_id]:
+            if self._conns[shard_id] is not None:
+                self._conns[shard_id].close()
+            self._workers[shard_id] = worker
+            self._conns[shard_id] = parent_conn
+
+    def start(self):
+        """Spawn one worker process per shard, restarting any that have died."""
+        with self._start_lock:
+            if not self._workers:
+                self._check_layout()
+                self._workers = [None] * self.num_shards
+                self._conns = [None] * self.num_shards
+                self._locks = [threading.Lock() for _ in range(self.num_shards)]
+                self._pool = ThreadPoolExecutor(max_workers=self.num_shards)
+                logger.info(f"Starting {self.num_shards} vector store shards under {self.base_path}")
+            for shard_id, worker in enumerate(self._workers):
+                if worker is not None and worker.is_alive():
+                    continue
+                if worker is not None:
+                    logger.warning(f"Shard {shard_id} worker exited with code {worker.exitcode}, restarting")
+                self._spawn(shard_id)
+        return self
+
+    def close(self):
+        """Stop all shard workers."""
+        with self._start_lock:
+            for shard_id, worker in enumerate(self._workers):
+                if worker is None:
+                    continue
+                if worker.is_alive():
+                    try:
+                        self._call(shard_id, "stop", None)
+                    except Exception as e:
+                        logger.warning(f"Error stopping shard {shard_id}: {str(e)}")
+                worker.join(timeout=5)
+                if worker.is_alive():
+                    worker.terminate()
+                self._conns[shard_id].close()
+            if self._pool is not None:
+                self._pool.shutdown(wait=True)
+            self._workers, self._conns, self._locks, self._pool = [], [], [], None
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+    def _call(self, shard_id, op, payload):
+        with self._locks[shard_id]:
+            try:
+                self._conns[shard_id].send((op, payload))
+                status, result = self._conns[shard_id].recv()
+            except (EOFError, OSError) as e:
+                # The worker died; the next start() (run by every scatter) restarts it
+                self._workers[shard_id].join(timeout=1)
+                raise RuntimeError(
+                    f"Shard {shard_id} worker is not running (exit code {self._workers[shard_id].exitcode})"
+                ) from e
+        if status != "ok":
+            logger.error(f"Shard {shard_id} failed on {op}: {str(result)}")
+            raise result
+        return result
+
+    def _scatter(self, requests):
+        """Run ``{shard_id: (op, payload)}`` on the shards in parallel."""
+        self.start()
+        futures = {
+            shard_id: self._pool.submit(self._call, shard_id, op, payload)
+            for shard_id, (op, payload) in requests.items()
+        }
+        return {shard_id: future.result() for shard_id, future in futures.items()}
+
+    def routing_key(self, metadata):
+        """Pick the key that decides which shard owns a chunk."""
+        metadata = metadata or {}
+        if self.route_by == "tenant":
+            return metadata.get("tenant", "default")
+        return metadata.get("document_id") or metadata.get("source") or metadata.get("filename", "")
+
+    def shard_for(self, metadata):
+        return shard_for_key(self.routing_key(metadata), self.num_shards)
+
+    def add_texts(self, texts, metadatas=None, ids=None, **kwargs):
+        """Route texts to their owning shards, which embed and index them in parallel.
+
+        Texts whose ids are already indexed are skipped, so passing stable ids
+        makes it safe to retry an add that failed on only some shards.
+        """
+        texts = list(texts)
+        metadatas = list(metadatas) if metadatas is not None else [{} for _ in texts]
+        ids = list(ids) if ids is not None else [str(uuid.uuid4()) for _ in texts]
+        batches = {}
+        for text, metadata, doc_id in zip(texts, metadatas, ids):
+            batch = batches.setdefault(self.shard_for(metadata), ([], [], []))
+            batch[0].append(text)
+            batch[1].append(metadata)
+            batch[2].append(doc_id)
+
+        results = self._scatter({shard_id: ("add", batch) for shard_id, batch in batches.items()})
+        if texts:
+            self._has_vectors = True
+        logger.info(f"Added {sum(results.values())} of {len(texts)} chunks across {len(batches)} shard(s)")
+        return ids
+
+    def similarity_search_with_score_by_vector(self, embedding, k=4, filter=None, **kwargs):
+        """Search every shard and merge the per-shard top-k with a heap."""
+        results = self._scatter({
+            shard_id: ("search", (embedding, k, filter)) for shard_id in range(self.num_shards)
+        })
+        # FAISS returns L2 distances, so smaller scores are better.
+        return heapq.nsmallest(
+            k,
+            (hit for shard_hits in results.values() for hit in shard_hits),
+            key=lambda hit: hit[1],
+        )
+
+    def similarity_search_with_score(self, query, k=4, filter=None, **kwargs):
+        embedding = self.embeddings.embed_query(query)
+        return self.similarity_search_with_score_by_vector(embedding, k=k, filter=filter)
+
+    def similarity_search_by_vector(self, embedding, k=4, **kwargs):
+        return [doc for doc, _ in self.similarity_search_with_score_by_vector(embedding, k=k, **kwargs)]
+
+    def similarity_search(self, query, k=4, **kwargs):
+        return [doc for doc, _ in self.similarity_search_with_score(query, k=k, **kwargs)]
+
+    def _select_relevance_score_fn(self):
+        return self._euclidean_relevance_score_fn
+
+    def count(self):
+        """Return the number of vectors held by each shard."""
+        results = self._scatter({shard_id: ("count", None) for shard_id in range(self.num_shards)})
+        return [results[shard_id] for shard_id in range(self.num_shards)]
+
+    def is_empty(self):
+        """Whether no shard holds any vectors.
+
+        Chunks are never removed, so once the store is known to be non-empty
+        the answer is cached and no further round trip is made.
+        """
+        if not self._has_vectors:
+            self._has_vectors = sum(self.count()) > 0
+        return not self._has_vectors
+
+    @classmethod
+    def from_texts(cls, texts, embedding=None, metadatas=None, ids=None, embedding_factory=None,
+                   base_path="vectorstore/shards", num_shards=None, **kwargs):
+        """Create a started sharded store and index the given texts.
+
+        Every worker process builds its own embeddings client, so pass a
+        picklable ``embedding_factory`` rather than an ``Embeddings`` instance.
+        """
+        if embedding_factory is None:
+            if embedding is not None:
+                raise TypeError(
+                    "ShardedVectorStore needs a picklable embedding_factory that each shard worker "
+                    f"calls to build its own client, not a {type(embedding).__name__} instance"
+                )
+            embedding_factory = google_embeddings
+        store = cls(base_path, num_shards or shard_count_from_env(), embedding_factory=embedding_factory, **kwargs)
+        store.start()
+        store.add_texts(texts, metadatas=metadatas, ids=ids)
+        return store
+
+    def add_documents(self, documents, ids=None, **kwargs):
+        return self.add_texts(
+            [doc.page_content for doc in documents],
+            metadatas=[doc.metadata for doc in documents],
+            ids=ids,
+        )
+
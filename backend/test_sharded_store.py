@@ -0,0 +1,91 @@
+from functools import partial
+
+import pytest
+from langchain_community.vectorstores import FAISS
+
+from benchmark_shards import make_corpus, offline_embeddings
+from sharded_store import ShardedVectorStore
+
+embedding_factory = partial(offline_embeddings, 32, 0.0)
+
+
+@pytest.fixture
+def open_store(tmp_path):
+    """Open started stores on ``tmp_path`` and stop their workers afterwards."""
+    stores = []
+
+    def _open(num_shards=3, base_path=tmp_path):
+        store = ShardedVectorStore(str(base_path), num_shards, embedding_factory=embedding_factory).start()
+        stores.append(store)
+        return store
+
+    yield _open
+    for store in stores:
+        store.close()
+
+
+def test_merged_top_k_matches_single_index(open_store):
+    texts, metadatas = make_corpus(600, 20)
+    single = FAISS.from_texts(texts, embedding_factory(), metadatas=metadatas)
+    store = open_store()
+    store.add_texts(texts, metadatas=metadatas)
+
+    for query in ["revenue risk", "bond yield", "cash flow audit"]:
+        expected = [doc.page_content for doc, _ in single.similarity_search_with_score(query, k=7)]
+        assert [doc.page_content for doc in store.similarity_search(query, k=7)] == expected
+
+
+def test_chunks_of_a_document_share_a_shard(open_store):
+    store = open_store()
+    store.add_texts([f"chunk {i}" for i in range(10)], metadatas=[{"source": "report.pdf"}] * 10)
+
+    assert sorted(store.count()) == [0, 0, 10]
+
+
+def test_readding_same_ids_does_not_duplicate(open_store):
+    texts, metadatas = make_corpus(60, 5)
+    ids = [f"doc:{i}" for i in range(60)]
+    store = open_store()
+    store.add_texts(texts, metadatas=metadatas, ids=ids)
+    counts = store.count()
+
+    store.add_texts(texts, metadatas=metadatas, ids=ids)
+
+    assert store.count() == counts
+    assert sum(counts) == 60
+
+
+def test_reopening_with_different_shard_count_raises(open_store):
+    open_store(num_shards=3)
+
+    with pytest.raises(ValueError, match="created with 3 shards"):
+        open_store(num_shards=2)
+
+
+def test_dead_worker_is_restarted(open_store):
+    texts, metadatas = make_corpus(60, 5)
+    store = open_store()
+    store.add_texts(texts, metadatas=metadatas)
+    counts = store.count()
+
+    store._workers[1].kill()
+    store._workers[1].join()
+
+    assert store.count() == counts
+    assert store._workers[1].is_alive()
+
+
+def test_stores_on_same_directory_see_each_others_writes(open_store):
+    writer = open_store()
+    reader = open_store()
+    assert reader.is_empty()
+
+    writer.add_texts(["first upload"], metadatas=[{"source": "a.pdf"}])
+    assert not reader.is_empty()
+    assert sum(reader.count()) == 1
+
+    reader.add_texts(["second upload"], metadatas=[{"source": "b.pdf"}])
+    assert sum(writer.count()) == 2
+    assert {doc.page_content for doc in writer.similarity_search("upload", k=5)} == {
+        "first upload", "second upload"
+    }